@@ -1,4 +1,4 @@
-import gdb, os.path, string, re, tempfile
+import gdb, concurrent.futures, functools, glob, hashlib, os.path, re, struct, subprocess
 # vim:et:ts=4:sw=4:autoindent
 
 """ This file adds various commands to gdb for use with debugging the linux
@@ -7,54 +7,329 @@ kernel modules.
 
 This file should be placed in the top of the kernel build directory. gdb will
 load this automatically when kernel debug commences.  This file depends on
-using gdb 7.1 or higher configured --with-python.
+using gdb 7.6 or higher configured --with-python for Python 3.6 or higher.
 
 """
 
-long_type = gdb.lookup_type('unsigned long')
-
 # These functions are counterparts to the Linux kernel macros
 def offset(gdb_type, member):
     '''Return the offset of a member within a structure.'''
     ptr = gdb.Value(0).cast(gdb_type.pointer())
-    return ptr[member].address.cast(long_type)
+    return ptr[member].address.cast(lookup_type('unsigned long'))
 
 def list_entry(list_head_ptr, gdb_type, off):
     '''Return the base element that holds a list_head struct.'''
-    base = list_head_ptr.cast(long_type) - off
+    base = list_head_ptr.cast(lookup_type('unsigned long')) - off
     return base.cast(gdb_type.pointer())
 
+# Type and member offset lookups only need to hit the debug info once per
+# kernel image.
+@functools.lru_cache(maxsize=None)
+def lookup_type(typename):
+    '''Return gdb.lookup_type(typename), caching the result.'''
+    return gdb.lookup_type(typename)
+
+@functools.lru_cache(maxsize=None)
+def member_offset(typename, member):
+    '''Return the offset of a member within a named structure, caching
+the result.'''
+    return offset(lookup_type(typename), member)
+
+def _forget_types(event):
+    """A new kernel image may lay its structures out differently."""
+    global _endian
+    lookup_type.cache_clear()
+    member_offset.cache_clear()
+    _endian = None
+
+if hasattr(gdb.events, 'clear_objfiles'):
+    gdb.events.clear_objfiles.connect(_forget_types)
+
 def listhead_iter(list_head, typename, member):
     '''Iterate over elements of a list_head.  The first argument should
 be a *reference* to the main list_head.'''
-    type = gdb.lookup_type(typename)
-    off = offset(type, member)
+    type = lookup_type(typename)
+    off = member_offset(typename, member)
     pos = list_head['next']
     while pos != list_head.address:
         yield list_entry(pos, type, off)
         pos = pos['next']
 
+def kernel_modules():
+    '''Return the kernel's "modules" list_head.  It is declared static in
+kernel/module.c, so finding it without a frame needs
+gdb.lookup_static_symbol (gdb 9 or higher); older versions fall back to
+gdb.lookup_symbol, which needs a selected frame.'''
+    sym = gdb.lookup_global_symbol("modules")
+    if sym is None and hasattr(gdb, 'lookup_static_symbol'):
+        sym = gdb.lookup_static_symbol("modules")
+    if sym is None:
+        sym = gdb.lookup_symbol("modules")[0]
+    if sym is None:
+        raise gdb.error("No symbol \"modules\" in the kernel image.")
+    return sym.value()
+
+# Map of inferior number -> {module name: struct module value}, valid until
+# the target is resumed.
+_module_cache = {}
+
+def _invalidate_module_cache(event=None):
+    """Drop cached module values once the target has been resumed."""
+    _module_cache.clear()
+
+gdb.events.cont.connect(_invalidate_module_cache)
+
+def module_dict(modules):
+    '''Return a {name: struct module} dict of the kernel's loaded modules,
+walking the modules list_head only once per stop.
+
+gdb sees no resume when the target is started by hand with "monitor go", so
+after that the cached list is stale.  Run "continue", or reset it with
+"python _invalidate_module_cache()", before looking modules up again.'''
+    num = gdb.selected_inferior().num
+    cache = _module_cache.get(num)
+    if cache is None:
+        cache = dict([ (mod['name'].string(), mod)
+                       for mod in listhead_iter(modules, 'struct module', 'list') ])
+        _module_cache[num] = cache
+    return cache
+
 def run(cmd):
     """Run a gdb command and get the output."""
-    tfile = tempfile.mkstemp()[1]
-    gdb.execute("set logging file %s" % tfile)
-    gdb.execute("set logging on")
-    gdb.execute(cmd)
-    gdb.execute("set logging off")
-    f = open(tfile)
-    lines = f.readlines()
-    f.close()
-    return lines
+    return gdb.execute(cmd, from_tty=False, to_string=True).splitlines(True)
+
+# Target byte order as a struct format prefix, filled on first use.
+_endian = None
+
+# struct format characters for an unsigned long of a given size.
+_ULONG_FMT = { 4: 'I', 8: 'Q' }
+
+# Section names are short; this is how far past the last name pointer we
+# read when fetching all of a module's section names in one go.
+_MAX_SECT_NAME = 64
+
+# Don't bother with a single read if the names are spread further apart.
+_MAX_NAME_SPAN = 16384
+
+def target_endian():
+    """Return the struct byte-order prefix for the target."""
+    global _endian
+    if _endian is None:
+        _endian = '>' if 'big endian' in run("show endian")[0] else '<'
+    return _endian
+
+def read_strings(ptrs):
+    """Return the NUL-terminated strings at the given target addresses.  When
+the strings sit close together they are fetched with one memory read;
+otherwise each one is read lazily as the result is iterated."""
+    if not ptrs:
+        return []
+    names = None
+    lo = min(ptrs)
+    hi = max(ptrs) + _MAX_SECT_NAME
+    if hi - lo <= _MAX_NAME_SPAN:
+        try:
+            blob = gdb.selected_inferior().read_memory(lo, hi - lo).tobytes()
+            names = []
+            for p in ptrs:
+                end = blob.find(b'\0', p - lo)
+                if end < 0:
+                    names = None
+                    break
+                names.append(blob[p - lo:end].decode())
+        except gdb.MemoryError:
+            names = None
+    if names is None:
+        char_ptr = lookup_type('char').pointer()
+        names = ( gdb.Value(p).cast(char_ptr).string() for p in ptrs )
+    return names
+
+# Sections passed to add-symbol-file with -s alongside a module's .text.
+_MOD_SECTIONS = ('.bss', '.data', '.init.text')
+
+# The sections add-symbol-file needs to place a module's symbols.
+_WANTED_SECTIONS = frozenset(('.text',) + _MOD_SECTIONS)
+
+def section_dict(mod, wanted=_WANTED_SECTIONS):
+    '''Return a {section name: address} dict for a struct module, holding
+only the wanted sections (all of them if wanted is None).  The
+sect_attrs->attrs[] array is read from the target in a single block rather
+than one field at a time.'''
+    sect = mod['sect_attrs']
+    num_sect = int(sect['nsections'])
+    attrs = sect['attrs']
+    size = lookup_type('struct module_sect_attr').sizeof
+    name_off = int(member_offset('struct module_sect_attr', 'name'))
+    addr_off = int(member_offset('struct module_sect_attr', 'address'))
+    fmt = target_endian() + _ULONG_FMT[lookup_type('unsigned long').sizeof]
+    buf = gdb.selected_inferior().read_memory(attrs.address, num_sect * size)
+    ptrs = [ struct.unpack_from(fmt, buf, i * size + name_off)[0]
+             for i in range(num_sect) ]
+    adict = {}
+    for i, name in enumerate(read_strings(ptrs)):
+        if wanted is not None and name not in wanted:
+            continue
+        addr = struct.unpack_from(fmt, buf, i * size + addr_off)[0]
+        adict[name] = '0x%x' % addr
+        # stop reading names once everything we need has turned up
+        if wanted is not None and len(adict) == len(wanted):
+            break
+    return adict
+
+# Map of .ko path -> (path, mtime, .text address) for modules whose symbols
+# are already loaded, so repeated commands don't make gdb re-read them.
+_loaded_mods = {}
+
+# Map of ssh target -> digest of the sysfs section listing last loaded from
+# it by add-kernel-modules-network.
+_target_digests = {}
+
+def _forget_loaded_mods(event):
+    """The symbol files or the target went away; reload everything next time."""
+    _loaded_mods.clear()
+    _target_digests.clear()
+
+for _event in ('clear_objfiles', 'inferior_deleted'):
+    if hasattr(gdb.events, _event):
+        getattr(gdb.events, _event).connect(_forget_loaded_mods)
+
+def _objfile_loaded(filename):
+    """Return True if gdb currently has filename loaded as an objfile.  Our
+own record can't see a remove-symbol-file, so ask gdb."""
+    path = os.path.realpath(filename)
+    for objfile in gdb.objfiles():
+        if objfile.filename and os.path.realpath(objfile.filename) == path:
+            return True
+    return False
+
+def _up_to_date(filename):
+    """Return True if filename's symbols are loaded and the file is unchanged."""
+    entry = _loaded_mods.get(filename)
+    if entry is None or not _objfile_loaded(filename):
+        return False
+    try:
+        return entry[1] == os.path.getmtime(filename)
+    except OSError:
+        return False
+
+def load_mod_symbols(filename, adict, sections=_MOD_SECTIONS, verbose=False):
+    """Run add-symbol-file for a module given its {section: address} dict,
+unless the same file is already loaded at the same address.  Return True
+if the module's symbols are loaded when this returns."""
+    try:
+        key = (filename, os.path.getmtime(filename), adict['.text'])
+    except OSError:
+        # e.g. removed by "make clean" since the build tree was indexed
+        print("Error: unable to load symbols for %s.\n" % filename)
+        return False
+    if _loaded_mods.get(filename) == key and _objfile_loaded(filename):
+        return True
+    parts = ['add-symbol-file', filename, adict['.text']]
+    for sec in sections:
+        if sec in adict:
+            parts.extend(('-s', sec, adict[sec]))
+    cmd = ' '.join(parts)
+    if verbose:
+        print(cmd)
+    try:
+        gdb.execute(cmd)
+    except gdb.error:
+        print("Error: unable to load symbols for %s.\n" % filename)
+        return False
+    _loaded_mods[filename] = key
+    return True
+
+# How much of each .ko to pull into the page cache ahead of gdb, and with
+# how many threads.
+_PREFETCH_BYTES = 65536
+_PREFETCH_WORKERS = 8
+
+def _prefetch(filename):
+    """Read the head of a file so it is cached when gdb opens it."""
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+        try:
+            os.read(fd, _PREFETCH_BYTES)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def prefetch_files(filenames):
+    """Warm the page cache for a batch of module files in the background
+while gdb works through them one at a time.  Files whose symbols are already
+loaded are left alone."""
+    # Worker threads must not take gdb's signals, and the pool starts its
+    # threads on submit().  Without gdb.block_signals() just skip the
+    # prefetch; it is only an optimization.
+    if not hasattr(gdb, 'block_signals'):
+        return
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=_PREFETCH_WORKERS)
+    with gdb.block_signals():
+        for filename in filenames:
+            if filename and not _up_to_date(filename):
+                pool.submit(_prefetch, filename)
+    pool.shutdown(wait=False)
+
+# Map of module name -> .ko path in the build tree, filled on first use.
+_ko_index = None
+
+# Set once the index has been rebuilt during the current command, so that a
+# run of lookup misses only walks the tree once.
+_ko_index_fresh = False
+
+def _get_ko_index(rescan=False):
+    """Walk the kernel build tree and index every .ko file by name.  The walk
+happens on first use, and again when rescan is set unless the index was
+already rebuilt during this command."""
+    global _ko_index, _ko_index_fresh
+    if _ko_index is None or (rescan and not _ko_index_fresh):
+        idx = {}
+        for root, dirs, files in os.walk('.'):
+            # don't descend into installed modules, only the build tree counts
+            if root == './lib' and 'modules' in dirs:
+                dirs.remove('modules')
+            for f in files:
+                # keep the first one we find, like find(1) would
+                if f.endswith('.ko') and f[:-3] not in idx:
+                    idx[f[:-3]] = os.path.join(root, f)
+        _ko_index = idx
+        _ko_index_fresh = True
+    return _ko_index
+
+def expire_ko_index():
+    """Let the next findBuildPath() miss rescan the build tree.  Called at the
+start of each command, so modules built since the last walk are found."""
+    global _ko_index_fresh
+    _ko_index_fresh = False
 
 def findBuildPath(m):
     """Find the .ko file in the kernel build tree."""
-    try:
-        paths = os.popen("find . ! -path './lib/modules/*' -name %s.ko" % m)
-        filename = paths.readline().strip() # use the first one we find
-        paths.close()
-        return filename
-    except:
-        return ''
+    path = _get_ko_index().get(m)
+    if path is None or not os.path.isfile(path):
+        path = _get_ko_index(rescan=True).get(m, '')
+    return path
+
+# (file, line) of the module load breakpoint, filled on first use.
+_load_break_loc = None
+
+def findLoadBreak():
+    """Find the source line to break at once a module is loaded."""
+    global _load_break_loc
+    if _load_break_loc is None:
+        # Here is a line of code that we can stop at. Once we are here, the
+        # new module is loaded, but we have not yet jumped into the code.
+        for path in sorted(glob.glob('kernel/*.c')):
+            with open(path, 'rb') as f:
+                text = f.read()
+            pos = text.find(b'if (mod->init != NULL)')
+            if pos >= 0: # use the first one we find
+                _load_break_loc = (path, text.count(b'\n', 0, pos) + 1)
+                break
+    return _load_break_loc
+
+# Matches the "grep -H" output for /sys/module/<mod>/sections/<sect> files.
+_SECT_RE = re.compile(r'/sys/module/(\w+)/sections/([.\w]+):(\w+)')
 
 class LsmodCmd(gdb.Command):
     '''Load symbols for all currently-running kernel modules.'''
@@ -66,13 +341,12 @@ class LsmodCmd(gdb.Command):
 
     def invoke(self, filename, from_tty):
         try:
-            frame = gdb.selected_frame()
-            modules = frame.read_var("modules")
-        except:
-            print 'A running kernel must be attached in order to get section information'
+            modules = kernel_modules()
+        except gdb.error:
+            print('A running kernel must be attached in order to get section information')
             return
         for mod in listhead_iter(modules, 'struct module', 'list'):
-            print mod['name'].string()
+            print(mod['name'].string())
         return
 
 class AddAllModsCmdFast(gdb.Command):
@@ -86,42 +360,85 @@ class AddAllModsCmdFast(gdb.Command):
     def invoke(self, target, from_tty):
         self.dont_repeat()
         if not target:
-            print 'This command gets the module data  from the target over an ssh connection.'
-            print 'EXAMPLE add-kernel-modules-network root@10.1.2.3'
+            print('This command gets the module data  from the target over an ssh connection.')
+            print('EXAMPLE add-kernel-modules-network root@10.1.2.3')
             return
+        expire_ko_index()
         gdb.execute("monitor go")
-        mods = os.popen("ssh %s 'find /sys/module/ -path \'*/sections/*\' -type f -exec grep -H 0x {} \\;'" % target)
-        expr = re.compile(r'/sys/module/(\w+)/sections/([.\w]+):(\w+)')
-        database = {}
-        for line in mods.readlines():
+        _invalidate_module_cache()
+        # Whatever happens below, don't leave the target running.
+        try:
+            # Parse the output as it arrives rather than waiting for ssh to
+            # exit.
             try:
-                record = expr.match(line).groups()
-            except:
-                continue
-            module = record[0]
-            section = record[1]
-            address = record[2]
-
-            if not database.has_key(module):
-                database[module] = {}
-            database[module][section] = address
-
-        mods.close()
-
-        for name, sects in database.iteritems():
-            filename = findBuildPath(name)
-            if not filename or not sects.has_key('.text'):
-                continue
-            cmd = 'add-symbol-file %s %s' % (filename, sects['.text'])
-            for sec, addr in sects.iteritems():
-                cmd += ' -s %s %s' % (sec, addr)
-            print cmd
+                mods = subprocess.Popen(['ssh', target,
+                                         "find /sys/module/ -path '*/sections/*' -type f -exec grep -H 0x {} +"],
+                                        stdout=subprocess.PIPE, universal_newlines=True)
+            except OSError as e:
+                print('Error: unable to run ssh: %s' % e)
+                return
+            match = _SECT_RE.match
+            digest = hashlib.blake2b(digest_size=16)
+            database = {}
             try:
-                gdb.execute(cmd)
-            except:
-                print "Error: unable to load symbols for %s.\n" % filename
-        del database
-        gdb.execute("monitor halt")
+                for line in iter(mods.stdout.readline, ''):
+                    digest.update(line.encode())
+                    m = match(line)
+                    if m is None:
+                        continue
+                    module, section, address = m.groups()
+                    database.setdefault(module, {})[section] = address
+            except BaseException:
+                # interrupted or failed mid-read: don't leave ssh behind
+                mods.kill()
+                raise
+            finally:
+                mods.stdout.close()
+                status = mods.wait()
+
+            # 255 is ssh's own failure; anything else comes from the remote
+            # find/grep, e.g. a module unloading mid-scan, so load what
+            # arrived but don't trust the listing as complete.
+            if status == 255 or not database:
+                print('Error: no module sections from %s (ssh exited with status %d)'
+                      % (target, status))
+                return
+            if status != 0:
+                print('Warning: module listing from %s may be incomplete (status %d)'
+                      % (target, status))
+
+            paths = dict([ (name, findBuildPath(name)) for name in database ])
+
+            # Same modules at the same addresses as last time, each one still
+            # loaded in gdb and not rebuilt since: nothing to load.
+            digest = digest.hexdigest()
+            if (status == 0 and _target_digests.get(target) == digest and
+                    all(paths[name] and _up_to_date(paths[name])
+                        for name, sects in database.items()
+                        if '.text' in sects)):
+                return
+
+            prefetch_files(paths.values())
+            complete = status == 0
+            for name, sects in database.items():
+                if '.text' not in sects:
+                    continue
+                filename = paths[name]
+                if not filename:
+                    complete = False
+                    continue
+                if not load_mod_symbols(filename, sects, sects.keys(),
+                                        verbose=True):
+                    complete = False
+            del database
+            # Only remember the listing if everything in it made it into
+            # gdb, so a later run picks up modules that failed this time.
+            if complete:
+                _target_digests[target] = digest
+            else:
+                _target_digests.pop(target, None)
+        finally:
+            gdb.execute("monitor halt")
 
 class AddAllModsCmd(gdb.Command):
     '''Load symbols for all currently-running kernel modules.'''
@@ -133,33 +450,25 @@ class AddAllModsCmd(gdb.Command):
 
     def invoke(self, filename, from_tty):
         self.dont_repeat()
+        expire_ko_index()
         try:
-            frame = gdb.selected_frame()
-            modules = frame.read_var("modules")
-        except:
-            print 'A running kernel must be attached in order to get section information'
+            modules = kernel_modules()
+        except gdb.error:
+            print('A running kernel must be attached in order to get section information')
             return
-        for mod in listhead_iter(modules, 'struct module', 'list'):
+        loaded = module_dict(modules)
+        paths = dict([ (name, findBuildPath(name)) for name in loaded ])
+        prefetch_files(paths.values())
+        for name, mod in loaded.items():
             # Now, get the section attributes
-            filename = findBuildPath(mod['name'].string())
+            filename = paths[name]
             if not os.path.isfile(filename):
-                print 'Could not find module file for %s' % mod['name'].string()
+                print('Could not find module file for %s' % name)
                 continue
-            sect = mod['sect_attrs']
-            num_sect = int(str(sect['nsections']))
-            attrs = [ sect['attrs'][i] for i in range(num_sect) ]
-            adict = dict([ (a['name'].string(), str(a['address']))
-                           for a in attrs ])
-            if not adict.has_key('.text'):
+            adict = section_dict(mod)
+            if '.text' not in adict:
                 continue
-            cmd = 'add-symbol-file %s %s' % (filename, adict['.text'])
-            for sec in ('.bss', '.data', '.init.text'):
-                if sec in adict:
-                    cmd += ' -s %s %s' % (sec, adict[sec])
-            try:
-                gdb.execute(cmd)
-            except:
-                print "Error: unable to load symbols for %s.\n" % filename
+            load_mod_symbols(filename, adict)
 
 class AddKernModCmd(gdb.Command):
     '''Load symbols for a currently-running kernel module.'''
@@ -172,36 +481,25 @@ class AddKernModCmd(gdb.Command):
     def invoke(self, modname, from_tty):
         self.dont_repeat()
         if modname == '':
-            print 'USAGE: modprobe module'
+            print('USAGE: modprobe module')
             return
+        expire_ko_index()
         filename = findBuildPath(modname)
         if not os.path.isfile(filename):
-            print 'Could not find module file for %s' % modname
+            print('Could not find module file for %s' % modname)
             return
         try:
-            frame = gdb.selected_frame()
-            modules = frame.read_var("modules")
-        except:
-            print 'A running kernel must be attached in order to get section information'
+            modules = kernel_modules()
+        except gdb.error:
+            print('A running kernel must be attached in order to get section information')
             return
-        for mod in listhead_iter(modules, 'struct module', 'list'):
-            if mod['name'].string() == modname:
-                # Found it!  Now, get the section attributes
-                sect = mod['sect_attrs']
-                num_sect = int(str(sect['nsections']))
-                attrs = [ sect['attrs'][i] for i in range(num_sect) ]
-                adict = dict([ (a['name'].string(), str(a['address']))
-                               for a in attrs ])
-                cmd = 'add-symbol-file %s %s' %(filename,adict['.text'])
-                for sec in ('.bss', '.data', '.init.text'):
-                    if sec in adict:
-                        cmd += ' -s %s %s' % (sec, adict[sec])
-                try:
-                    gdb.execute(cmd)
-                except:
-                    print "Error: unable to load symbols for %s.\n" % filename
-                return
-        print 'Module %s is not currently loaded by the kernel.' % modname
+        mod = module_dict(modules).get(modname)
+        if mod is None:
+            print('Module %s is not currently loaded by the kernel.' % modname)
+            return
+        # Found it!  Now, get the section attributes
+        adict = section_dict(mod)
+        load_mod_symbols(filename, adict)
 
 class AddThisModCmd(gdb.Command):
     '''Load symbols for a currently-running kernel module.'''
@@ -215,8 +513,8 @@ class AddThisModCmd(gdb.Command):
         try:
             frame = gdb.selected_frame()
             mod = frame.read_var("mod")
-        except:
-            print 'This command should be run while stopped at a breakpoint\njust after load_module() returns in kernel/module.c'
+        except (gdb.error, ValueError):
+            print('This command should be run while stopped at a breakpoint\njust after load_module() returns in kernel/module.c')
             return
         # Now, get the section attributes
         this_module = mod["name"].string()
@@ -224,25 +522,15 @@ class AddThisModCmd(gdb.Command):
             name = this_module
         if name != this_module:
             return
+        expire_ko_index()
         filename = findBuildPath(this_module)
         if not os.path.isfile(filename):
-            print 'Could not find module file for %s' % this_module
+            print('Could not find module file for %s' % this_module)
             return
-        sect = mod['sect_attrs']
-        num_sect = int(str(sect['nsections']))
-        attrs = [ sect['attrs'][i] for i in range(num_sect) ]
-        adict = dict([ (a['name'].string(), str(a['address']))
-                       for a in attrs ])
-        if not adict.has_key('.text'):
+        adict = section_dict(mod)
+        if '.text' not in adict:
             return
-        cmd = 'add-symbol-file %s %s' %(filename,adict['.text'])
-        for sec in ('.bss', '.data', '.init.text'):
-            if sec in adict:
-                cmd += ' -s %s %s' % (sec, adict[sec])
-        try:
-            gdb.execute(cmd)
-        except:
-            print "Error: unable to load symbols for %s.\n" % filename
+        load_mod_symbols(filename, adict)
 
 class LoadBreakCmd(gdb.Command):
     '''Set a breakpoint after a module is loaded. You can use add-this-module to load symbols for the current module.'''
@@ -253,13 +541,11 @@ class LoadBreakCmd(gdb.Command):
 
     def invoke(self, arg, from_tty):
         self.dont_repeat()
-        # Here is a line of code that we can stop at. Once we are here, the new module is loaded, but 
-        # we have not yet jumped into the code.
-        paths = os.popen("grep -n -e 'if (mod->init != NULL)' kernel/*.c")
-        loc = paths.readline().strip() # use the first one we find
-        file, line, _ = string.split(loc, ':')
-        paths.close()
-        cmd = "break %s:%d" % (file, int(line))
+        loc = findLoadBreak()
+        if loc is None:
+            print('Could not find the module init call in kernel/*.c')
+            return
+        cmd = "break %s:%d" % loc
         gdb.execute(cmd)
 
 class GoandQuitCmd(gdb.Command):
@@ -271,6 +557,7 @@ class GoandQuitCmd(gdb.Command):
 
     def invoke(self, arg, from_tty):
         gdb.execute("monitor go")
+        _invalidate_module_cache()
         gdb.execute("quit")
 
 # Construct the command objects
@@ -289,11 +576,11 @@ gdb.execute("set remotetimeout 15")
 # agrees with it.
 
 arch_str = run("show architecture")[0]
-if arch_str.find("ia64"):
+if "ia64" in arch_str:
     arch = "ia64"
-elif arch_str.find("x86-64"):
+elif "x86-64" in arch_str:
     arch = "x86_64"
-elif arch_str.find("i386"):
+elif "i386" in arch_str:
     arch = "ia32"
 else:
     arch = "unknown"